@@ -4,8 +4,12 @@ Model monitoring and metrics collection
 
 import time
 import logging
+import threading
 from datetime import datetime
-from prometheus_client import Counter, Histogram, Gauge, start_http_server
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+from urllib.parse import parse_qs
+from prometheus_client import Counter, Histogram, Gauge, REGISTRY
+from prometheus_client.exposition import ThreadingWSGIServer, choose_encoder
 from functools import wraps
 
 # Configure logging
@@ -18,6 +22,13 @@ PREDICTION_LATENCY = Histogram('ml_prediction_duration_seconds', 'Time spent on
 MODEL_ACCURACY = Gauge('ml_model_accuracy', 'Current model accuracy')
 API_REQUESTS = Counter('api_requests_total', 'Total API requests', ['method', 'endpoint', 'status'])
 
+# Prediction metrics are buffered and pushed to Prometheus in batches
+FLUSH_BATCH_SIZE = 64
+FLUSH_INTERVAL_SECONDS = 1.0
+
+# Rendered /metrics payloads are reused for this long across scrapes
+METRICS_CACHE_TTL_SECONDS = 2.0
+
 class ModelMonitor:
     """Monitor model performance and API metrics"""
     
@@ -25,20 +36,48 @@ class ModelMonitor:
         self.start_time = datetime.now()
         self.prediction_count = 0
         self.total_latency = 0.0
+        self._pending_latencies = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._request_counters = {}
         
     def record_prediction(self, latency: float, prediction: int, probability: float):
         """Record a prediction event"""
-        PREDICTION_COUNTER.inc()
-        PREDICTION_LATENCY.observe(latency)
-        
-        self.prediction_count += 1
-        self.total_latency += latency
+        with self._lock:
+            self._pending_latencies.append(latency)
+            self.prediction_count += 1
+            self.total_latency += latency
+            
+            if (len(self._pending_latencies) >= FLUSH_BATCH_SIZE
+                    or time.monotonic() - self._last_flush >= FLUSH_INTERVAL_SECONDS):
+                self._flush_locked()
         
         logger.info(f"Prediction recorded: {prediction}, prob: {probability:.3f}, latency: {latency:.3f}s")
         
+    def flush(self):
+        """Push buffered prediction metrics to Prometheus"""
+        with self._lock:
+            self._flush_locked()
+            
+    def _flush_locked(self):
+        batch = self._pending_latencies
+        self._pending_latencies = []
+        self._last_flush = time.monotonic()
+        if not batch:
+            return
+        
+        PREDICTION_COUNTER.inc(len(batch))
+        for latency in batch:
+            PREDICTION_LATENCY.observe(latency)
+        
     def record_api_request(self, method: str, endpoint: str, status_code: int):
         """Record an API request"""
-        API_REQUESTS.labels(method=method, endpoint=endpoint, status=str(status_code)).inc()
+        key = (method, endpoint, status_code)
+        counter = self._request_counters.get(key)
+        if counter is None:
+            counter = API_REQUESTS.labels(method=method, endpoint=endpoint, status=str(status_code))
+            self._request_counters[key] = counter
+        counter.inc()
         
     def update_model_accuracy(self, accuracy: float):
         """Update model accuracy metric"""
@@ -84,14 +123,111 @@ def monitor_prediction(func):
             raise
     return wrapper
 
-def start_metrics_server(port: int = 8001):
+# Background flusher, started once however many times the server is started
+_flush_stop = threading.Event()
+_flush_thread = None
+_flush_thread_lock = threading.Lock()
+
+def _flush_loop():
+    """Periodically flush buffered metrics so idle periods are still reported"""
+    while not _flush_stop.wait(FLUSH_INTERVAL_SECONDS):
+        monitor.flush()
+
+def _start_flush_thread():
+    """Start the flush loop unless it is already running"""
+    global _flush_thread
+    with _flush_thread_lock:
+        if _flush_thread is None:
+            _flush_stop.clear()
+            _flush_thread = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flush_thread.start()
+
+def _stop_flush_thread():
+    """Stop the flush loop and push whatever is still buffered"""
+    global _flush_thread
+    with _flush_thread_lock:
+        if _flush_thread is not None:
+            _flush_stop.set()
+            _flush_thread.join()
+            _flush_thread = None
+    monitor.flush()
+
+class CachedMetricsApp:
+    """WSGI app serving the rendered registry, regenerated at most once per TTL"""
+    
+    def __init__(self, registry=REGISTRY, ttl: float = METRICS_CACHE_TTL_SECONDS):
+        self.registry = registry
+        self.ttl = ttl
+        # content type -> (rendered_at, payload); text and OpenMetrics scrapes differ
+        self._payloads = {}
+        self._lock = threading.Lock()
+        
+    def render(self, accept_header=None) -> tuple:
+        """Return (content_type, payload) for the negotiated format, cached per format"""
+        encoder, content_type = choose_encoder(accept_header)
+        with self._lock:
+            now = time.monotonic()
+            rendered_at, payload = self._payloads.get(content_type, (float("-inf"), b""))
+            if now - rendered_at >= self.ttl:
+                payload = encoder(self.registry)
+                self._payloads[content_type] = (now, payload)
+            return content_type, payload
+        
+    def __call__(self, environ, start_response):
+        method = environ.get("REQUEST_METHOD", "GET")
+        if method == "OPTIONS":
+            start_response("200 OK", [("Allow", "OPTIONS,GET")])
+            return [b""]
+        if method != "GET":
+            start_response("405 Method Not Allowed", [("Allow", "OPTIONS,GET")])
+            return [f"# HTTP 405 Method Not Allowed: {method}; use OPTIONS or GET\n".encode()]
+        if environ.get("PATH_INFO") == "/favicon.ico":
+            start_response("200 OK", [])
+            return [b""]
+        
+        accept_header = environ.get("HTTP_ACCEPT")
+        params = parse_qs(environ.get("QUERY_STRING", ""))
+        if "name[]" in params:
+            # Filtered scrapes are rare and vary by query, so they bypass the cache
+            encoder, content_type = choose_encoder(accept_header)
+            payload = encoder(self.registry.restricted_registry(params["name[]"]))
+        else:
+            content_type, payload = self.render(accept_header)
+        start_response("200 OK", [
+            ("Content-Type", content_type),
+            ("Content-Length", str(len(payload))),
+        ])
+        return [payload]
+
+class _QuietHandler(WSGIRequestHandler):
+    """Request handler that does not log every scrape to stderr"""
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int = 8001, addr: str = "0.0.0.0"):
     """Start Prometheus metrics server"""
-    start_http_server(port)
+    # Serve uncompressed payloads from a threaded server: gzip costs more CPU
+    # than it saves bandwidth for a scrape on the local network. Concurrent
+    # scrapes within the TTL share a single rendering of the registry.
+    app = CachedMetricsApp()
+    httpd = make_server(addr, port, app, ThreadingWSGIServer, handler_class=_QuietHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    _start_flush_thread()
     logger.info(f"Metrics server started on port {port}")
+    return httpd
+
+def stop_metrics_server(httpd):
+    """Stop a server returned by start_metrics_server, along with the flush loop"""
+    httpd.shutdown()
+    httpd.server_close()
+    _stop_flush_thread()
+    logger.info("Metrics server stopped")
 
 if __name__ == "__main__":
     # Start metrics server for testing
-    start_metrics_server()
+    httpd = start_metrics_server()
     
     # Simulate some metrics
     monitor.record_prediction(0.05, 1, 0.85)
@@ -105,4 +241,5 @@ if __name__ == "__main__":
         while True:
             time.sleep(60)
     except KeyboardInterrupt:
-        print("Shutting down metrics server")
\ No newline at end of file
+        print("Shutting down metrics server")
+        stop_metrics_server(httpd)
\ No newline at end of file
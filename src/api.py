@@ -2,14 +2,19 @@
 FastAPI application for heart disease prediction model serving.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 import joblib
+import msgspec
 import numpy as np
+import asyncio
+import json
 import logging
 import os
 from datetime import datetime
-from typing import Dict, Any
+from operator import attrgetter
+from typing import Annotated, Dict, Any, List, Optional
 import mlflow
 import mlflow.sklearn
 
@@ -39,18 +44,172 @@ class HeartDiseaseInput(BaseModel):
     ca: int = Field(..., description="Number of major vessels colored by fluoroscopy (0-4)")
     thal: int = Field(..., description="Thalassemia (0-3)")
 
+# msgspec mirror of HeartDiseaseInput, decoded and validated in one C pass
+class HeartDiseaseInputStruct(msgspec.Struct):
+    age: Annotated[int, msgspec.Meta(ge=29, le=77)]
+    sex: int
+    cp: int
+    trestbps: Annotated[int, msgspec.Meta(ge=94, le=200)]
+    chol: Annotated[int, msgspec.Meta(ge=126, le=564)]
+    fbs: int
+    restecg: int
+    thalach: Annotated[int, msgspec.Meta(ge=71, le=202)]
+    exang: int
+    oldpeak: Annotated[float, msgspec.Meta(ge=0.0, le=6.2)]
+    slope: int
+    ca: int
+    thal: int
+
+# strict=False accepts integral floats such as 54.0, as pydantic does on /predict
+_fast_input_decoder = msgspec.json.Decoder(HeartDiseaseInputStruct, strict=False)
+
 class PredictionResponse(BaseModel):
     prediction: int = Field(..., description="Prediction (0 = no disease, 1 = disease)")
     probability: float = Field(..., description="Probability of heart disease")
     model_version: str = Field(..., description="Model version used")
     timestamp: str = Field(..., description="Prediction timestamp")
 
+# Upper bound on rows accepted by /predict-batch
+MAX_BATCH_REQUEST_ITEMS = 1000
+
+class BatchPredictionInput(BaseModel):
+    items: List[HeartDiseaseInput] = Field(
+        ..., description="Inputs to score together", min_length=1, max_length=MAX_BATCH_REQUEST_ITEMS
+    )
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[PredictionResponse] = Field(..., description="Predictions in input order")
+
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     version: str
     timestamp: str
 
+# Compiled model exported next to the joblib file by train.py
+MODEL_PATH = "models/model-latest.joblib"
+ONNX_MODEL_PATH = "models/model-latest.onnx"
+
+# Feature order expected by the model
+FEATURE_NAMES = (
+    "age", "sex", "cp", "trestbps", "chol", "fbs",
+    "restecg", "thalach", "exang", "oldpeak", "slope", "ca", "thal"
+)
+_get_features = attrgetter(*FEATURE_NAMES)
+
+# Micro-batching settings for /predict
+MAX_BATCH_SIZE = 32
+MAX_BATCH_WAIT_MS = 10
+
+class PredictionBatcher:
+    """Coalesce concurrent predictions into a single predict_proba call"""
+    
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_BATCH_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Trees split on float32 internally, so this avoids a conversion copy
+        self._buffer = np.empty((max_batch_size, len(FEATURE_NAMES)), dtype=np.float32)
+        self._loop = None
+        self._queue = None
+        self._worker = None
+    
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+    
+    async def submit(self, features: tuple) -> np.ndarray:
+        """Queue one row of features and wait for its class probabilities"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((features, future))
+        return await future
+    
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            futures = [future for _, future in batch]
+            try:
+                n = len(batch)
+                self._buffer[:n] = [features for features, _ in batch]
+                # Run inference off the event loop; requests arriving
+                # meanwhile queue up for the next batch
+                probabilities = await run_in_threadpool(model.predict_proba, self._buffer[:n])
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for future, proba in zip(futures, probabilities):
+                if not future.done():
+                    future.set_result(proba)
+    
+    def stop(self):
+        """Cancel the background worker"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+batcher = PredictionBatcher()
+
+class OnnxModel:
+    """predict_proba/classes_ view of the ONNX export, served by onnxruntime"""
+    
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        meta = session.get_modelmeta().custom_metadata_map
+        self.classes_ = np.array(json.loads(meta.get("classes", "[0, 1]")))
+        self.model_type = meta.get("model_type", "onnx")
+        self.version = meta.get("version")
+    
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        # Outputs are (label, probabilities)
+        return self.session.run(None, {self.input_name: features})[1]
+
+def load_onnx_model(path: str = ONNX_MODEL_PATH, expected_version: Optional[str] = None):
+    """Load the ONNX export of the model, if onnxruntime and the file are available
+    and it was exported by the training run that wrote expected_version"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        logger.info("onnxruntime not installed; using sklearn for inference")
+        return None
+    
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    except Exception as e:
+        logger.warning(f"Could not load ONNX model: {e}")
+        return None
+    
+    onnx_model = OnnxModel(session)
+    if onnx_model.version != expected_version:
+        logger.warning(f"Ignoring ONNX model {path}: version {onnx_model.version} "
+                       f"does not match {expected_version}")
+        return None
+    
+    logger.info(f"Loaded ONNX model: {path}")
+    return onnx_model
+
 # Global variables for model
 model = None
 model_version = "unknown"
@@ -67,20 +226,29 @@ def load_model():
             logger.info(f"Loaded model from MLflow: {model_uri}")
         except Exception as e:
             logger.warning(f"Could not load from MLflow: {e}")
-            # Fallback to local file
-            model_path = "models/model-latest.joblib"
-            if os.path.exists(model_path):
-                model = joblib.load(model_path)
-                # Try to get version from file
-                version_path = "model_version.txt"
-                if os.path.exists(version_path):
-                    with open(version_path, 'r') as f:
-                        model_version = f.read().strip()
-                else:
-                    model_version = "v1.0.0"
-                logger.info(f"Loaded model from local file: {model_path}")
+            # Try to get version from file
+            version_path = "model_version.txt"
+            file_version = None
+            if os.path.exists(version_path):
+                with open(version_path, 'r') as f:
+                    file_version = f.read().strip()
+            
+            # Fallback to local file, preferring the compiled ONNX export; the pickled
+            # forest is only deserialized when it is missing, stale or onnxruntime is unavailable
+            onnx_model = load_onnx_model(expected_version=file_version)
+            if onnx_model is not None:
+                model = onnx_model
+                model_path = ONNX_MODEL_PATH
+            elif os.path.exists(MODEL_PATH):
+                loaded = joblib.load(MODEL_PATH)
+                # train.py stores {"model": ..., "meta": ...}; older files hold the bare model
+                model = loaded["model"] if isinstance(loaded, dict) else loaded
+                model_path = MODEL_PATH
             else:
                 raise FileNotFoundError("No model file found")
+            
+            model_version = file_version or "v1.0.0"
+            logger.info(f"Loaded model from local file: {model_path}")
         
         logger.info(f"Model loaded successfully. Version: {model_version}")
         return True
@@ -95,6 +263,11 @@ async def startup_event():
     if not load_model():
         logger.warning("API started without a model. Predictions will fail.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the prediction batcher when the API shuts down"""
+    batcher.stop()
+
 @app.get("/", response_model=Dict[str, str])
 async def root():
     """Root endpoint"""
@@ -114,46 +287,77 @@ async def health_check():
         timestamp=datetime.now().isoformat()
     )
 
+async def _make_prediction(input_data) -> Dict[str, Any]:
+    """Predict for one input exposing the feature attributes"""
+    try:
+        # Make prediction; concurrent requests share one predict_proba call
+        proba = await batcher.submit(_get_features(input_data))
+        prediction = model.classes_[np.argmax(proba)]
+        probability = proba[1]  # Probability of class 1 (disease)
+        
+        # Log prediction for monitoring
+        logger.info(f"Prediction made: {prediction}, Probability: {probability:.3f}")
+        
+        return {
+            "prediction": int(prediction),
+            "probability": float(probability),
+            "model_version": model_version,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Prediction error: {e}")
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
 @app.post("/predict", response_model=PredictionResponse)
 async def predict(input_data: HeartDiseaseInput):
     """Make a heart disease prediction"""
     if model is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
+    return PredictionResponse(**await _make_prediction(input_data))
+
+@app.post("/predict-fast", response_model=PredictionResponse)
+async def predict_fast(request: Request):
+    """Make a heart disease prediction, parsing the body with msgspec instead of pydantic"""
     try:
-        # Convert input to numpy array
-        features = np.array([[
-            input_data.age,
-            input_data.sex,
-            input_data.cp,
-            input_data.trestbps,
-            input_data.chol,
-            input_data.fbs,
-            input_data.restecg,
-            input_data.thalach,
-            input_data.exang,
-            input_data.oldpeak,
-            input_data.slope,
-            input_data.ca,
-            input_data.thal
-        ]])
-        
-        # Make prediction
-        prediction = model.predict(features)[0]
-        probability = model.predict_proba(features)[0][1]  # Probability of class 1 (disease)
+        input_data = _fast_input_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    result = await _make_prediction(input_data)
+    return Response(content=msgspec.json.encode(result), media_type="application/json")
+
+@app.post("/predict-batch", response_model=BatchPredictionResponse)
+async def predict_batch(batch: BatchPredictionInput):
+    """Make heart disease predictions for several inputs with one model call"""
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    try:
+        features = np.array([_get_features(item) for item in batch.items], dtype=np.float32)
+        proba = await run_in_threadpool(model.predict_proba, features)
+        predictions = model.classes_[np.argmax(proba, axis=1)]
         
         # Log prediction for monitoring
-        logger.info(f"Prediction made: {prediction}, Probability: {probability:.3f}")
+        logger.info(f"Batch prediction made for {len(features)} inputs")
         
-        return PredictionResponse(
-            prediction=int(prediction),
-            probability=float(probability),
-            model_version=model_version,
-            timestamp=datetime.now().isoformat()
-        )
+        timestamp = datetime.now().isoformat()
+        return BatchPredictionResponse(predictions=[
+            PredictionResponse(
+                prediction=int(prediction),
+                probability=float(row[1]),  # Probability of class 1 (disease)
+                model_version=model_version,
+                timestamp=timestamp
+            )
+            for prediction, row in zip(predictions, proba)
+        ])
         
     except Exception as e:
-        logger.error(f"Prediction error: {e}")
+        logger.error(f"Batch prediction error: {e}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 @app.get("/model-info")
@@ -163,12 +367,10 @@ async def model_info():
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     return {
-        "model_type": type(model).__name__,
+        "model_type": getattr(model, "model_type", type(model).__name__),
         "version": model_version,
-        "features": [
-            "age", "sex", "cp", "trestbps", "chol", "fbs", 
-            "restecg", "thalach", "exang", "oldpeak", "slope", "ca", "thal"
-        ],
+        "runtime": "onnxruntime" if isinstance(model, OnnxModel) else "sklearn",
+        "features": list(FEATURE_NAMES),
         "target": "heart_disease (0: no disease, 1: disease)"
     }
 
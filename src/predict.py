@@ -8,8 +8,19 @@ MODEL_PATH = "models/model-latest.joblib"
 
 st.set_page_config(page_title="Heart Disease Predictor", layout="centered")
 
+@st.cache_resource
+def get_model():
+    # Deserialized once per server process instead of on every click
+    data = joblib.load(MODEL_PATH)
+    # model-latest.joblib may hold the bare estimator or a {"model", "meta"} dict
+    return data["model"] if isinstance(data, dict) else data
+
+model = get_model() if os.path.exists(MODEL_PATH) else None
+
 st.title("Heart Disease Prediction")
 st.markdown("Fill the fields below (use typical clinical values). The model is a RandomForest trained on a heart disease dataset.")
+if model is None:
+    st.error("Model not found. Run training (python src/train.py) to generate models/model-latest.joblib.")
 
 # Left column: Demographics
 st.header("Demographics")
@@ -36,28 +47,22 @@ ca = st.selectbox("Number of major vessels colored by fluoroscopy (0-4)", (0,1,2
 thal = st.selectbox("Thalassemia (1 = normal; 2 = fixed defect; 3 = reversible defect)", (1,2,3))
 
 # Predict button
-if st.button("Predict"):
-    # load model
-    if not os.path.exists(MODEL_PATH):
-        st.error("Model not found. Run training (python src/train.py) to generate models/model-latest.joblib.")
-    else:
-        data = joblib.load(MODEL_PATH)
-        model = data["model"]
-        # Construct feature vector consistent with training preprocess:
-        sex_num = 1 if sex == "Male" else 0
-        fbs_num = 1 if fbs == "Yes" else 0
-        exang_num = 1 if exang == "Yes" else 0
-
-        # Order of features: we select numeric columns from training df,
-        # but to keep simple, assume model trained on common features:
-        X = np.array([[age, sex_num, cp, trestbps, chol, fbs_num, restecg, thalach, exang_num, oldpeak, slope, ca, thal]])
-        try:
-            pred = model.predict(X)
-            proba = model.predict_proba(X) if hasattr(model, "predict_proba") else None
-            label = "Likely Heart Disease" if pred[0] == 1 else "Unlikely Heart Disease"
-            st.subheader("Result")
-            st.write(label)
-            if proba is not None:
-                st.write(f"Confidence (no disease / disease): {proba[0][0]:.2f} / {proba[0][1]:.2f}")
-        except Exception as e:
-            st.error(f"Failed to predict: {e}")
+if st.button("Predict", disabled=model is None):
+    # Construct feature vector consistent with training preprocess:
+    sex_num = 1 if sex == "Male" else 0
+    fbs_num = 1 if fbs == "Yes" else 0
+    exang_num = 1 if exang == "Yes" else 0
+
+    # Order of features: we select numeric columns from training df,
+    # but to keep simple, assume model trained on common features:
+    X = np.array([[age, sex_num, cp, trestbps, chol, fbs_num, restecg, thalach, exang_num, oldpeak, slope, ca, thal]])
+    try:
+        pred = model.predict(X)
+        proba = model.predict_proba(X) if hasattr(model, "predict_proba") else None
+        label = "Likely Heart Disease" if pred[0] == 1 else "Unlikely Heart Disease"
+        st.subheader("Result")
+        st.write(label)
+        if proba is not None:
+            st.write(f"Confidence (no disease / disease): {proba[0][0]:.2f} / {proba[0][1]:.2f}")
+    except Exception as e:
+        st.error(f"Failed to predict: {e}")
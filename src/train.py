@@ -1,12 +1,18 @@
 # src/train.py
+import io
 import os
+import json
+import time
+import shutil
+import pickle
 import datetime
+import functools
 import subprocess
+import urllib.request
 import joblib
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 import mlflow
 import mlflow.sklearn
@@ -20,11 +26,96 @@ logger = logging.getLogger(__name__)
 MODEL_DIR = "models"
 MODEL_PREFIX = "model"
 MODEL_VERSION_FILE = "model_version.txt"
+ONNX_MODEL_PATH = os.path.join(MODEL_DIR, "model-latest.onnx")
+# "random_forest" or "hist_gradient_boosting" (features binned to uint8 histograms)
+MODEL_KIND = os.environ.get("MODEL_KIND", "random_forest")
+MODEL_PARAMS = {
+    "random_forest": {"n_estimators": 100, "max_depth": 10, "random_state": 42},
+    "hist_gradient_boosting": {"max_iter": 100, "max_depth": 6, "max_bins": 255, "random_state": 42},
+}
+# Build forest trees on all cores (sklearn only; HistGradientBoosting uses OpenMP)
+N_JOBS = -1
+# Train the random forest with cuML on a CUDA GPU; falls back to sklearn if cuML is missing
+USE_GPU = os.environ.get("USE_GPU", "0") == "1"
 DATA_URL = "https://raw.githubusercontent.com/jbrownlee/Datasets/master/heart-disease.csv"
 # Note: alternative datasets exist; this CSV has common heart-disease columns.
+CLEVELAND_URL = "https://archive.ics.uci.edu/ml/machine-learning-databases/heart-disease/processed.cleveland.data"
+# Local copy of the Cleveland data, refreshed once it is older than the max age
+DATA_CACHE_PATH = os.path.join("data", "cleveland.parquet")
+DATA_CACHE_MAX_AGE_DAYS = 30
+# Holdout split, cached so repeated runs reuse the same row indices
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+SPLIT_CACHE_PATH = os.path.join("data", "split_idx.npz")
+# Bump whenever stratified_indices changes which rows it assigns, so cached splits are redone
+SPLIT_ALGORITHM_VERSION = 2
+# Compact feature dtypes: continuous measurements as float32, codes/flags as int8
+FEATURE_DTYPES = {
+    'age': 'float32', 'trestbps': 'float32', 'chol': 'float32',
+    'thalach': 'float32', 'oldpeak': 'float32',
+    'sex': 'int8', 'cp': 'int8', 'fbs': 'int8', 'restecg': 'int8',
+    'exang': 'int8', 'slope': 'int8', 'ca': 'int8', 'thal': 'int8',
+}
 
 # --- Helpers ---
+def _find_git_dir(start="."):
+    path = os.path.abspath(start)
+    while True:
+        candidate = os.path.join(path, ".git")
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):
+            # Worktrees and submodules: .git is a "gitdir: <path>" pointer
+            with open(candidate) as f:
+                content = f.read().strip()
+            if not content.startswith("gitdir: "):
+                return None
+            return os.path.normpath(os.path.join(path, content[len("gitdir: "):]))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+def _read_head_sha(git_dir):
+    with open(os.path.join(git_dir, "HEAD")) as f:
+        head = f.read().strip()
+    if not head.startswith("ref: "):
+        return head  # detached HEAD
+    
+    ref = head[len("ref: "):]
+    # A worktree keeps its own HEAD but shares refs with the main repository
+    ref_dirs = [git_dir]
+    commondir_path = os.path.join(git_dir, "commondir")
+    if os.path.exists(commondir_path):
+        with open(commondir_path) as f:
+            ref_dirs.append(os.path.normpath(os.path.join(git_dir, f.read().strip())))
+    
+    for ref_dir in ref_dirs:
+        ref_path = os.path.join(ref_dir, ref)
+        if os.path.exists(ref_path):
+            with open(ref_path) as f:
+                return f.read().strip()
+        # Refs packed by git gc live in packed-refs as "<sha> <ref>" lines
+        packed_path = os.path.join(ref_dir, "packed-refs")
+        if os.path.exists(packed_path):
+            with open(packed_path) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+    raise LookupError(f"Unresolved ref: {ref}")
+
+@functools.lru_cache(maxsize=1)
 def get_git_sha():
+    # Resolve HEAD from .git directly rather than forking a git process
+    try:
+        git_dir = _find_git_dir()
+        if git_dir is None:
+            return "nogit"  # not a checkout, e.g. inside the Docker image
+        return _read_head_sha(git_dir)[:7]
+    except Exception:
+        pass
+    # A repository the direct read cannot resolve: let git handle it
     try:
         sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"]).decode().strip()
         return sha
@@ -34,60 +125,200 @@ def get_git_sha():
 def ensure_dirs():
     os.makedirs(MODEL_DIR, exist_ok=True)
 
-def load_data():
+def link_latest(src, dst):
+    """Point dst at src via a hardlink, copying when linking is unsupported"""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def build_model(kind=MODEL_KIND, use_gpu=USE_GPU):
+    if kind == "random_forest":
+        if use_gpu:
+            try:
+                from cuml.ensemble import RandomForestClassifier as GPURandomForestClassifier
+                return GPURandomForestClassifier(**MODEL_PARAMS[kind], output_type="numpy")
+            except ImportError:
+                logger.warning("cuML not installed; training on CPU")
+        return RandomForestClassifier(**MODEL_PARAMS[kind], n_jobs=N_JOBS)
+    if kind == "hist_gradient_boosting":
+        return HistGradientBoostingClassifier(**MODEL_PARAMS[kind])
+    raise ValueError(f"Unknown MODEL_KIND: {kind}")
+
+def export_onnx(model, n_features, version, path=ONNX_MODEL_PATH):
+    """Export the model to ONNX so the API can serve it with onnxruntime"""
+    # Never leave an export from a previous model behind for the API to pick up
+    if os.path.exists(path):
+        os.remove(path)
+    
+    try:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+    except ImportError:
+        logger.warning("skl2onnx not installed; skipping ONNX export")
+        return None
+    
+    try:
+        onnx_model = convert_sklearn(
+            model,
+            initial_types=[("X", FloatTensorType([None, n_features]))],
+            options={id(model): {"zipmap": False}}  # plain probability tensor
+        )
+        # Let the API serve the export without unpickling the sklearn model
+        # "version" lets the API reject an export left over from another run
+        for key, value in (("classes", json.dumps(model.classes_.tolist())),
+                           ("model_type", type(model).__name__),
+                           ("version", version)):
+            prop = onnx_model.metadata_props.add()
+            prop.key, prop.value = key, value
+        with open(path, "wb") as f:
+            f.write(onnx_model.SerializeToString())
+    except Exception as e:
+        logger.warning(f"ONNX export failed: {e}")
+        return None
+    
+    logger.info(f"Exported ONNX model to: {path}")
+    return path
+
+def _data_cache_is_fresh(path=DATA_CACHE_PATH, max_age_days=DATA_CACHE_MAX_AGE_DAYS):
+    if not os.path.exists(path):
+        return False
+    return time.time() - os.path.getmtime(path) < max_age_days * 86400
+
+def _read_cleveland_csv(url=CLEVELAND_URL):
     # read CSV from UCI heart disease dataset
     # The Cleveland dataset has 14 attributes but no header
     column_names = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg', 
                    'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal', 'target']
-    df = pd.read_csv('https://archive.ics.uci.edu/ml/machine-learning-databases/heart-disease/processed.cleveland.data', 
-                     header=None, names=column_names)
-    # Replace '?' with NaN
-    df = df.replace('?', np.nan)
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pacsv
+    except ImportError:
+        # '?' marks missing values
+        return pd.read_csv(url, header=None, names=column_names, na_values='?')
+    
+    with urllib.request.urlopen(url) as response:
+        raw = response.read()
+    # Typed columns with '?' as null: no object-dtype inference or replace pass
+    table = pacsv.read_csv(
+        io.BytesIO(raw),
+        read_options=pacsv.ReadOptions(column_names=column_names),
+        convert_options=pacsv.ConvertOptions(
+            null_values=['?'],
+            column_types={col: pa.float64() for col in column_names}
+        )
+    )
+    return table.to_pandas()
+
+@functools.lru_cache(maxsize=1)
+def _load_cleveland():
+    if _data_cache_is_fresh():
+        return pd.read_parquet(DATA_CACHE_PATH)
+    
+    try:
+        df = _read_cleveland_csv()
+    except Exception as e:
+        if not os.path.exists(DATA_CACHE_PATH):
+            raise
+        # Offline: an expired copy is still better than failing the run
+        logger.warning(f"Could not download dataset ({e}); using stale cache {DATA_CACHE_PATH}")
+        return pd.read_parquet(DATA_CACHE_PATH)
+    
+    try:
+        os.makedirs(os.path.dirname(DATA_CACHE_PATH), exist_ok=True)
+        df.to_parquet(DATA_CACHE_PATH, compression="zstd")
+    except Exception as e:
+        logger.warning(f"Could not cache dataset to {DATA_CACHE_PATH}: {e}")
     return df
 
+def load_data():
+    # Downloaded at most once per process and once per cache period on disk;
+    # callers get their own copy to mutate
+    return _load_cleveland().copy()
+
 def preprocess(df):
     # Basic preprocessing: drop NA, do minimal encoding.
-    df = df.dropna().reset_index(drop=True)
-    # Convert columns to numeric
-    for col in df.columns:
-        if col != 'target':
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    df = df.dropna().reset_index(drop=True)
+    # Convert every column to numeric once; missing ('?') and unparseable
+    # cells both become NaN, so a single row mask replaces repeated dropna passes
+    df = df.apply(pd.to_numeric, errors='coerce')
+    df = df[df.notna().all(axis=1).to_numpy()].reset_index(drop=True)
     
     # The target column is already named 'target'
     target_col = 'target'
     X = df.drop(columns=[target_col])
-    y = df[target_col].apply(lambda v: 1 if v > 0 else 0)  # ensure binary 0/1
+    # ensure binary 0/1
+    y = pd.Series((df[target_col].to_numpy() > 0).astype(np.int8), index=df.index, name=target_col)
     
-    # Keep numeric features only (simple)
-    X = X.select_dtypes(include=[np.number]).fillna(0)
+    # All columns are numeric and NaN-free here, so no select_dtypes/fillna pass
+    X = X.astype({col: dtype for col, dtype in FEATURE_DTYPES.items() if col in X.columns})
     return X, y
 
+def stratified_indices(y, test_size=TEST_SIZE, seed=SPLIT_SEED):
+    """Hold out test_size of each class from a single shuffle of all rows"""
+    y = np.asarray(y)
+    order = np.random.default_rng(seed).permutation(len(y))
+    shuffled = y[order]
+    train_idx, test_idx = [], []
+    for label in np.unique(y):
+        # Rows of this class, already in shuffled order
+        idx = order[shuffled == label]
+        n_test = int(round(len(idx) * test_size))
+        test_idx.append(idx[:n_test])
+        train_idx.append(idx[n_test:])
+    return np.sort(np.concatenate(train_idx)), np.sort(np.concatenate(test_idx))
+
+def load_split_indices(y, test_size=TEST_SIZE, seed=SPLIT_SEED, path=SPLIT_CACHE_PATH):
+    """Stratified split indices, reused from disk when labels and settings match"""
+    y = np.asarray(y)
+    if os.path.exists(path):
+        try:
+            with np.load(path) as cached:
+                if ("version" in cached.files and cached["version"] == SPLIT_ALGORITHM_VERSION
+                        and np.array_equal(cached["y"], y) and cached["test_size"] == test_size
+                        and cached["seed"] == seed):
+                    return cached["train"], cached["test"]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable split cache {path}: {e}")
+    
+    train_idx, test_idx = stratified_indices(y, test_size, seed)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, train=train_idx, test=test_idx, y=y, test_size=test_size, seed=seed,
+                 version=SPLIT_ALGORITHM_VERSION)
+    except OSError as e:
+        logger.warning(f"Could not cache split indices to {path}: {e}")
+    return train_idx, test_idx
+
 def train_and_save(X, y):
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    train_idx, test_idx = load_split_indices(y)
+    X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+    y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
+    if not 0.3 < y_test.mean() < 0.7:
+        logger.warning(f"Holdout positive rate {y_test.mean():.2f} is far from balanced")
     
     # Set MLflow experiment
     mlflow.set_experiment("heart-disease-prediction")
     
     with mlflow.start_run():
-        # Model parameters
-        n_estimators = 100
-        random_state = 42
-        max_depth = 10
-        
         # Log parameters
-        mlflow.log_param("n_estimators", n_estimators)
-        mlflow.log_param("random_state", random_state)
-        mlflow.log_param("max_depth", max_depth)
-        mlflow.log_param("test_size", 0.2)
+        mlflow.log_param("model_kind", MODEL_KIND)
+        mlflow.log_params(MODEL_PARAMS[MODEL_KIND])
+        mlflow.log_param("test_size", TEST_SIZE)
         
         # Train model
-        model = RandomForestClassifier(
-            n_estimators=n_estimators, 
-            random_state=random_state,
-            max_depth=max_depth
-        )
+        model = build_model()
+        if type(model).__module__.startswith("cuml"):
+            # cuML requires float32 features and int32 labels
+            X_train, X_test = X_train.astype(np.float32), X_test.astype(np.float32)
+            y_train = y_train.astype(np.int32)
+            mlflow.log_param("device", "gpu")
         model.fit(X_train, y_train)
+        if "n_jobs" in model.get_params():
+            # The API predicts a handful of rows at a time; spawning workers
+            # per call costs more than it saves, so persist single-threaded
+            model.set_params(n_jobs=1)
         
         # Make predictions
         y_pred = model.predict(X_test)
@@ -126,11 +357,12 @@ def train_and_save(X, y):
                 "n_features": len(X.columns)
             }
         }
-        joblib.dump(model_data, model_path)
+        joblib.dump(model_data, model_path, compress=3, protocol=pickle.HIGHEST_PROTOCOL)
 
-        # Save as latest
+        # Save as latest: link to the versioned file instead of pickling twice
         latest_path = os.path.join(MODEL_DIR, "model-latest.joblib")
-        joblib.dump(model, latest_path)
+        link_latest(model_path, latest_path)
+        export_onnx(model, len(X.columns), version)
 
         # Save version
         with open(MODEL_VERSION_FILE, "w") as f:
@@ -4,15 +4,37 @@ Utility functions for the MLOps project
 
 import logging
 import time
+import functools
 import json
 import pickle
 import joblib
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Optional, Sequence, Union
 import pandas as pd
 import numpy as np
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+from sklearn.metrics import confusion_matrix
+
+# Features expected by the model, in training order
+REQUIRED_FEATURES = (
+    'age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg',
+    'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal'
+)
+_REQUIRED_FEATURE_SET = frozenset(REQUIRED_FEATURES)
+
+# Last formatted second as (epoch_second, iso_string); replaced as a whole so
+# concurrent readers never see a mismatched pair
+_last_timestamp = (None, '')
+
+def now_iso() -> str:
+    """Current local time in ISO format, second resolution, formatted once per second"""
+    global _last_timestamp
+    second = int(time.time())
+    cached_second, text = _last_timestamp
+    if second != cached_second:
+        text = datetime.fromtimestamp(second).isoformat()
+        _last_timestamp = (second, text)
+    return text
 
 def setup_logging(level: str = "INFO", log_file: Optional[str] = None) -> logging.Logger:
     """Setup logging configuration"""
@@ -57,7 +79,7 @@ def save_model(model: Any, filepath: Union[str, Path], metadata: Optional[Dict]
     model_data = {
         'model': model,
         'metadata': metadata or {},
-        'saved_at': datetime.now().isoformat()
+        'saved_at': now_iso()
     }
     joblib.dump(model_data, filepath)
 
@@ -68,50 +90,85 @@ def load_model(filepath: Union[str, Path]) -> tuple:
 
 def calculate_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
     """Calculate classification metrics"""
+    # Derive all scores from one confusion matrix instead of recounting per metric.
+    # Matches sklearn's support-weighted averages, with 0 for undefined ratios.
+    cm = confusion_matrix(y_true, y_pred)
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    
+    def _ratio(num, den):
+        return np.divide(num, den, out=np.zeros_like(num), where=den != 0)
+    
+    precision = _ratio(tp, predicted)
+    recall = _ratio(tp, support)
+    f1 = _ratio(2 * tp, support + predicted)
+    weights = support / support.sum()
+    
     return {
-        'accuracy': accuracy_score(y_true, y_pred),
-        'precision': precision_score(y_true, y_pred, average='weighted'),
-        'recall': recall_score(y_true, y_pred, average='weighted'),
-        'f1_score': f1_score(y_true, y_pred, average='weighted')
+        'accuracy': float(tp.sum() / cm.sum()),
+        'precision': float(precision @ weights),
+        'recall': float(recall @ weights),
+        'f1_score': float(f1 @ weights)
     }
 
 def create_confusion_matrix(y_true: np.ndarray, y_pred: np.ndarray) -> np.ndarray:
     """Create confusion matrix"""
     return confusion_matrix(y_true, y_pred)
 
-def validate_input_data(data: Dict[str, Any], required_features: list) -> bool:
+def validate_input_data(data: Dict[str, Any], required_features: Sequence[str] = REQUIRED_FEATURES) -> bool:
     """Validate input data for prediction"""
     # Check if all required features are present
-    missing_features = set(required_features) - set(data.keys())
+    required = (_REQUIRED_FEATURE_SET if required_features is REQUIRED_FEATURES
+                else frozenset(required_features))
+    missing_features = required.difference(data)
     if missing_features:
-        raise ValueError(f"Missing required features: {missing_features}")
+        raise ValueError(f"Missing required features: {set(missing_features)}")
     
     # Check data types and ranges (basic validation)
-    for feature, value in data.items():
-        if feature in required_features:
-            if not isinstance(value, (int, float)):
-                raise ValueError(f"Feature {feature} must be numeric, got {type(value)}")
-            if np.isnan(value) or np.isinf(value):
-                raise ValueError(f"Feature {feature} contains invalid value: {value}")
+    values = [data[feature] for feature in required_features]
+    for feature, value in zip(required_features, values):
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"Feature {feature} must be numeric, got {type(value)}")
+    
+    # One vectorized NaN/inf check instead of two scalar ufunc calls per feature
+    invalid = np.flatnonzero(~np.isfinite(np.fromiter(values, dtype=np.float64, count=len(values))))
+    if invalid.size:
+        i = invalid[0]
+        raise ValueError(f"Feature {required_features[i]} contains invalid value: {values[i]}")
     
     return True
 
+# Probability thresholds separating Low / Medium / High risk
+MEDIUM_RISK_THRESHOLD = 0.3
+HIGH_RISK_THRESHOLD = 0.7
+
+def risk_level(probability: float) -> str:
+    """Map a disease probability to a risk level"""
+    if probability > HIGH_RISK_THRESHOLD:
+        return 'High'
+    if probability > MEDIUM_RISK_THRESHOLD:
+        return 'Medium'
+    return 'Low'
+
 def format_prediction_response(prediction: int, probability: float, model_version: str) -> Dict[str, Any]:
     """Format prediction response"""
+    probability = float(probability)
     return {
         'prediction': int(prediction),
-        'probability': float(probability),
+        'probability': probability,
         'model_version': model_version,
-        'timestamp': datetime.now().isoformat(),
-        'risk_level': 'High' if probability > 0.7 else 'Medium' if probability > 0.3 else 'Low'
+        'timestamp': now_iso(),
+        'risk_level': risk_level(probability)
     }
 
 def measure_inference_time(func):
     """Decorator to measure inference time"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         result = func(*args, **kwargs)
-        inference_time = time.time() - start_time
+        inference_time = time.perf_counter() - start_time
         
         if isinstance(result, dict):
             result['inference_time_ms'] = inference_time * 1000
@@ -157,12 +214,12 @@ def generate_model_report(model, X_test: pd.DataFrame, y_test: pd.Series,
     
     # Add feature importance if available
     if hasattr(model, 'feature_importances_'):
-        importance_dict = dict(zip(X_test.columns, model.feature_importances_))
-        report['feature_importance'] = sorted(
-            importance_dict.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )
+        importances = np.asarray(model.feature_importances_)
+        order = np.argsort(-importances, kind='stable')
+        report['feature_importance'] = list(zip(
+            np.asarray(X_test.columns)[order].tolist(),
+            importances[order].tolist()
+        ))
     
     return report
 
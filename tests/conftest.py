@@ -0,0 +1,43 @@
+"""
+Shared pytest fixtures
+"""
+
+import pytest
+import numpy as np
+import os
+import sys
+from sklearn.ensemble import RandomForestClassifier
+
+# Add src to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from train import load_data, preprocess
+
+@pytest.fixture(scope="session")
+def cleveland():
+    """Cleveland dataset loaded and preprocessed once per test session"""
+    df = load_data()
+    X, y = preprocess(df)
+    return df, X, y
+
+@pytest.fixture(scope="session")
+def fitted_model():
+    """Small forest fitted on synthetic rows, for serving tests that need a model"""
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.integers(29, 78, 200),     # age
+        rng.integers(0, 2, 200),       # sex
+        rng.integers(0, 4, 200),       # cp
+        rng.integers(94, 201, 200),    # trestbps
+        rng.integers(126, 565, 200),   # chol
+        rng.integers(0, 2, 200),       # fbs
+        rng.integers(0, 3, 200),       # restecg
+        rng.integers(71, 203, 200),    # thalach
+        rng.integers(0, 2, 200),       # exang
+        rng.uniform(0.0, 6.2, 200),    # oldpeak
+        rng.integers(0, 3, 200),       # slope
+        rng.integers(0, 5, 200),       # ca
+        rng.integers(0, 4, 200),       # thal
+    ]).astype(np.float32)
+    y = (X[:, 0] + 10 * X[:, 2] > 70).astype(int)
+    return RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
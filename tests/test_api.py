@@ -4,7 +4,9 @@ Test suite for the FastAPI application
 
 import pytest
 from fastapi.testclient import TestClient
+import httpx
 import numpy as np
+import asyncio
 import json
 import os
 import sys
@@ -12,10 +14,39 @@ import sys
 # Add src to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+import api
 from api import app
 
 client = TestClient(app)
 
+VALID_INPUT = {
+    "age": 54,
+    "sex": 1,
+    "cp": 0,
+    "trestbps": 140,
+    "chol": 239,
+    "fbs": 0,
+    "restecg": 1,
+    "thalach": 160,
+    "exang": 0,
+    "oldpeak": 1.2,
+    "slope": 2,
+    "ca": 0,
+    "thal": 2
+}
+
+@pytest.fixture
+def loaded_model(monkeypatch, fitted_model):
+    """Serve the fitted test model, as if startup had loaded it"""
+    monkeypatch.setattr(api, "model", fitted_model)
+    monkeypatch.setattr(api, "model_version", "test")
+    return fitted_model
+
+def score_single_row(model, item):
+    """Probability of disease from a direct one-row predict_proba call"""
+    row = np.array([[item[name] for name in api.FEATURE_NAMES]], dtype=np.float32)
+    return float(model.predict_proba(row)[0, 1])
+
 class TestAPI:
     """Test the FastAPI endpoints"""
     
@@ -43,36 +74,48 @@ class TestAPI:
         # May return 503 if model not loaded, that's ok for testing
         assert response.status_code in [200, 503]
         
-    def test_predict_endpoint_valid_input(self):
+    def test_predict_endpoint_valid_input(self, loaded_model):
         """Test prediction with valid input"""
-        valid_input = {
-            "age": 54,
-            "sex": 1,
-            "cp": 0,
-            "trestbps": 140,
-            "chol": 239,
-            "fbs": 0,
-            "restecg": 1,
-            "thalach": 160,
-            "exang": 0,
-            "oldpeak": 1.2,
-            "slope": 2,
-            "ca": 0,
-            "thal": 2
-        }
+        response = client.post("/predict", json=VALID_INPUT)
+        assert response.status_code == 200
+        data = response.json()
+        assert "prediction" in data
+        assert "probability" in data
+        assert data["model_version"] == "test"
+        assert "timestamp" in data
+        assert data["prediction"] in [0, 1]
+        assert data["probability"] == pytest.approx(score_single_row(loaded_model, VALID_INPUT))
+        
+    def test_predict_endpoint_without_model(self, monkeypatch):
+        """Test prediction is refused while no model is loaded"""
+        monkeypatch.setattr(api, "model", None)
+        response = client.post("/predict", json=VALID_INPUT)
+        assert response.status_code == 503
         
-        response = client.post("/predict", json=valid_input)
-        # May return 503 if model not loaded
-        if response.status_code == 200:
-            data = response.json()
-            assert "prediction" in data
-            assert "probability" in data
-            assert "model_version" in data
-            assert "timestamp" in data
-            assert data["prediction"] in [0, 1]
-            assert 0.0 <= data["probability"] <= 1.0
-        else:
-            assert response.status_code == 503
+    def test_predict_endpoint_concurrent_requests(self, loaded_model, monkeypatch):
+        """Test concurrent requests batched together each get their own row's result"""
+        items = [dict(VALID_INPUT, age=age, chol=200 + 5 * i)
+                 for i, age in enumerate(range(30, 78, 3))]
+        batch_sizes = []
+        predict_proba = loaded_model.predict_proba
+        
+        def counting_predict_proba(features):
+            batch_sizes.append(len(features))
+            return predict_proba(features)
+        
+        monkeypatch.setattr(loaded_model, "predict_proba", counting_predict_proba)
+        
+        async def post_all():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                return await asyncio.gather(*(ac.post("/predict", json=item) for item in items))
+        
+        responses = asyncio.run(post_all())
+        assert sum(batch_sizes) == len(items)
+        assert len(batch_sizes) < len(items)
+        for item, response in zip(items, responses):
+            assert response.status_code == 200
+            assert response.json()["probability"] == pytest.approx(score_single_row(loaded_model, item))
             
     def test_predict_endpoint_invalid_input(self):
         """Test prediction with invalid input"""
@@ -104,4 +147,63 @@ class TestAPI:
         }
         
         response = client.post("/predict", json=incomplete_input)
-        assert response.status_code == 422  # Validation error
\ No newline at end of file
+        assert response.status_code == 422  # Validation error
+        
+    def test_predict_fast_endpoint_valid_input(self, loaded_model):
+        """Test msgspec-backed prediction with valid input"""
+        response = client.post("/predict-fast", json=VALID_INPUT)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["prediction"] in [0, 1]
+        assert data["probability"] == pytest.approx(score_single_row(loaded_model, VALID_INPUT))
+        assert data["model_version"] == "test"
+        assert "timestamp" in data
+        
+    def test_predict_fast_endpoint_matches_predict(self, loaded_model):
+        """Test /predict-fast accepts what /predict accepts, including integral floats"""
+        item = dict(VALID_INPUT, age=54.0, chol=239.0)
+        fast = client.post("/predict-fast", json=item)
+        slow = client.post("/predict", json=item)
+        assert fast.status_code == slow.status_code == 200
+        assert fast.json()["probability"] == slow.json()["probability"]
+        
+    def test_predict_fast_endpoint_invalid_input(self):
+        """Test msgspec-backed prediction rejects out-of-range and missing fields"""
+        response = client.post("/predict-fast", json={"age": -5, "sex": 1})
+        assert response.status_code == 422  # Validation error
+        
+    def test_predict_batch_endpoint(self, loaded_model):
+        """Test batch prediction returns one result per input, matching /predict"""
+        items = [VALID_INPUT, dict(VALID_INPUT, age=70), dict(VALID_INPUT, cp=3, thal=1)]
+        
+        response = client.post("/predict-batch", json={"items": items})
+        assert response.status_code == 200
+        predictions = response.json()["predictions"]
+        assert len(predictions) == len(items)
+        for item, data in zip(items, predictions):
+            single = client.post("/predict", json=item).json()
+            assert data["prediction"] == single["prediction"]
+            assert data["probability"] == pytest.approx(single["probability"])
+            assert data["model_version"] == "test"
+            
+    def test_predict_batch_endpoint_empty(self):
+        """Test batch prediction rejects an empty batch"""
+        response = client.post("/predict-batch", json={"items": []})
+        assert response.status_code == 422  # Validation error
+
+class TestModelLoading:
+    """Test choosing between the ONNX export and the joblib model"""
+    
+    def test_onnx_export_from_another_run_is_ignored(self, fitted_model, tmp_path):
+        """Test an ONNX export only loads when its version matches model_version.txt"""
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("skl2onnx")
+        from train import export_onnx
+        
+        path = str(tmp_path / "model-latest.onnx")
+        assert export_onnx(fitted_model, len(api.FEATURE_NAMES), "20250101-abc1234", path=path) == path
+        
+        assert api.load_onnx_model(path, expected_version="20250202-def5678") is None
+        onnx_model = api.load_onnx_model(path, expected_version="20250101-abc1234")
+        assert onnx_model is not None
+        assert onnx_model.version == "20250101-abc1234"
@@ -0,0 +1,134 @@
+"""
+Test suite for the monitoring metrics
+"""
+
+import pytest
+import os
+import sys
+
+# Add monitoring to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'monitoring'))
+
+import metrics
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge
+from prometheus_client import exposition
+from prometheus_client.openmetrics.exposition import CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE
+
+def predictions_total():
+    return REGISTRY.get_sample_value("ml_predictions_total")
+
+class TestModelMonitor:
+    """Test buffered prediction metrics"""
+    
+    @pytest.fixture(autouse=True)
+    def no_interval_flush(self, monkeypatch):
+        # Only the batch size or an explicit flush() may push metrics here
+        monkeypatch.setattr(metrics, "FLUSH_INTERVAL_SECONDS", 3600)
+    
+    def test_counter_waits_for_full_batch(self):
+        """Test predictions are pushed once FLUSH_BATCH_SIZE have been recorded"""
+        monitor = metrics.ModelMonitor()
+        before = predictions_total()
+        
+        for _ in range(metrics.FLUSH_BATCH_SIZE - 1):
+            monitor.record_prediction(0.01, 1, 0.8)
+        assert predictions_total() == before
+        
+        monitor.record_prediction(0.01, 1, 0.8)
+        assert predictions_total() == before + metrics.FLUSH_BATCH_SIZE
+        assert monitor.prediction_count == metrics.FLUSH_BATCH_SIZE
+        
+    def test_flush_pushes_pending_predictions(self):
+        """Test flush() pushes exactly the buffered predictions, once"""
+        monitor = metrics.ModelMonitor()
+        before = predictions_total()
+        
+        for _ in range(5):
+            monitor.record_prediction(0.01, 0, 0.2)
+        assert predictions_total() == before
+        
+        monitor.flush()
+        assert predictions_total() == before + 5
+        monitor.flush()
+        assert predictions_total() == before + 5
+
+def scrape(app, accept=None, query=""):
+    """Call a WSGI app like a GET /metrics and return (content_type, body)"""
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/metrics", "QUERY_STRING": query}
+    if accept is not None:
+        environ["HTTP_ACCEPT"] = accept
+    captured = {}
+    
+    def start_response(status, headers):
+        captured["status"] = status
+        captured["headers"] = dict(headers)
+    
+    body = b"".join(app(environ, start_response))
+    assert captured["status"] == "200 OK"
+    return captured["headers"]["Content-Type"], body.decode()
+
+class TestCachedMetricsApp:
+    """Test the cached /metrics WSGI app"""
+    
+    @pytest.fixture
+    def registry(self):
+        registry = CollectorRegistry()
+        Counter("test_requests", "Requests", registry=registry).inc()
+        Gauge("test_accuracy", "Accuracy", registry=registry).set(0.9)
+        return registry
+    
+    def test_scrapes_within_ttl_render_once(self, registry, monkeypatch):
+        """Test two scrapes inside the TTL share one generate_latest call"""
+        calls = []
+        generate_latest = exposition.generate_latest
+        
+        def counting_generate_latest(reg):
+            calls.append(reg)
+            return generate_latest(reg)
+        
+        monkeypatch.setattr(exposition, "generate_latest", counting_generate_latest)
+        app = metrics.CachedMetricsApp(registry, ttl=60)
+        
+        first = scrape(app)
+        second = scrape(app)
+        assert len(calls) == 1
+        assert first == second
+        assert "test_requests_total 1.0" in first[1]
+        
+    def test_openmetrics_accept_header(self, registry):
+        """Test an OpenMetrics Accept header gets an OpenMetrics body, cached separately"""
+        app = metrics.CachedMetricsApp(registry, ttl=60)
+        text_type, text_body = scrape(app)
+        om_type, om_body = scrape(app, accept="application/openmetrics-text; version=1.0.0")
+        
+        assert om_type == OPENMETRICS_CONTENT_TYPE
+        assert om_body.endswith("# EOF\n")
+        assert text_type != om_type
+        # The text format exposes _created samples as separate gauges
+        assert "# TYPE test_requests_created gauge" in text_body
+        assert "# TYPE test_requests_created gauge" not in om_body
+        
+    def test_name_filter(self, registry):
+        """Test name[] restricts the scrape to the requested metrics"""
+        app = metrics.CachedMetricsApp(registry, ttl=60)
+        scrape(app)  # populate the cache with the full registry
+        
+        _, body = scrape(app, query="name[]=test_accuracy")
+        assert "test_accuracy 0.9" in body
+        assert "test_requests" not in body
+
+class TestMetricsServer:
+    """Test the metrics server lifecycle"""
+    
+    def test_flush_thread_started_once_and_stopped(self):
+        """Test repeated starts share one flush thread and stop ends it"""
+        first = metrics.start_metrics_server(port=0, addr="127.0.0.1")
+        flush_thread = metrics._flush_thread
+        second = metrics.start_metrics_server(port=0, addr="127.0.0.1")
+        assert metrics._flush_thread is flush_thread
+        assert flush_thread.is_alive()
+        
+        metrics.stop_metrics_server(second)
+        metrics.stop_metrics_server(first)
+        assert not flush_thread.is_alive()
+        assert metrics._flush_thread is None
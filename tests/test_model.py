@@ -7,20 +7,22 @@ import pandas as pd
 import numpy as np
 import os
 import sys
+import time
 import tempfile
 import shutil
 
 # Add src to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from train import load_data, preprocess, get_git_sha
+import train
+from train import preprocess, get_git_sha, stratified_indices, load_split_indices, _find_git_dir, _read_head_sha
 
 class TestDataProcessing:
     """Test data loading and preprocessing"""
     
-    def test_load_data(self):
+    def test_load_data(self, cleveland):
         """Test data loading function"""
-        df = load_data()
+        df, _, _ = cleveland
         assert isinstance(df, pd.DataFrame)
         assert len(df) > 0
         assert 'target' in df.columns
@@ -60,11 +62,175 @@ class TestDataProcessing:
         assert 'target' not in X.columns
         assert set(y.unique()).issubset({0, 1})
         
+    def test_stratified_indices(self):
+        """Test the holdout split is disjoint, complete and class-balanced"""
+        y = np.array([0] * 60 + [1] * 40)
+        train_idx, test_idx = stratified_indices(y, test_size=0.2, seed=42)
+        
+        assert len(np.intersect1d(train_idx, test_idx)) == 0
+        assert len(train_idx) + len(test_idx) == len(y)
+        assert np.bincount(y[test_idx]).tolist() == [12, 8]
+        
+        # Same seed gives the same split
+        again_train, again_test = stratified_indices(y, test_size=0.2, seed=42)
+        assert np.array_equal(train_idx, again_train)
+        assert np.array_equal(test_idx, again_test)
+        
+    def test_split_cache_ignores_other_algorithm_version(self, tmp_path):
+        """Test a split cached by an older algorithm is recomputed, not reused"""
+        y = np.array([0] * 60 + [1] * 40)
+        path = str(tmp_path / "split_idx.npz")
+        stale_train, stale_test = np.arange(80), np.arange(80, 100)
+        np.savez(path, train=stale_train, test=stale_test, y=y, test_size=0.2, seed=42)
+        
+        train_idx, test_idx = load_split_indices(y, test_size=0.2, seed=42, path=path)
+        expected_train, expected_test = stratified_indices(y, test_size=0.2, seed=42)
+        assert np.array_equal(train_idx, expected_train)
+        assert np.array_equal(test_idx, expected_test)
+        
+        # The rewritten cache is reused on the next call
+        cached_train, cached_test = load_split_indices(y, test_size=0.2, seed=42, path=path)
+        assert np.array_equal(cached_train, expected_train)
+        assert np.array_equal(cached_test, expected_test)
+        
     def test_git_sha_function(self):
         """Test git SHA retrieval"""
         sha = get_git_sha()
         assert isinstance(sha, str)
         assert len(sha) > 0
+    
+    def test_git_sha_without_repository(self, monkeypatch):
+        """Test no git process is started when there is no repository"""
+        monkeypatch.setattr(train, "_find_git_dir", lambda start=".": None)
+        
+        def no_subprocess(*args, **kwargs):
+            raise AssertionError("git should not be run")
+        
+        monkeypatch.setattr(train.subprocess, "check_output", no_subprocess)
+        get_git_sha.cache_clear()
+        try:
+            assert get_git_sha() == "nogit"
+        finally:
+            get_git_sha.cache_clear()
+    
+    def test_git_sha_from_packed_refs(self, tmp_path):
+        """Test that a branch packed by git gc is resolved from packed-refs"""
+        git_dir = tmp_path / ".git"
+        git_dir.mkdir()
+        (git_dir / "HEAD").write_text("ref: refs/heads/main\n")
+        (git_dir / "packed-refs").write_text(
+            "# pack-refs with: peeled fully-peeled sorted\n"
+            "1111111111111111111111111111111111111111 refs/heads/dev\n"
+            "2222222222222222222222222222222222222222 refs/heads/main\n"
+        )
+        
+        assert _find_git_dir(tmp_path) == str(git_dir)
+        assert _read_head_sha(str(git_dir)) == "2" * 40
+    
+    def test_git_sha_from_gitdir_file(self, tmp_path):
+        """Test that a .git file stops the search instead of reaching the parent repo"""
+        parent_git = tmp_path / ".git"
+        (parent_git / "refs" / "heads").mkdir(parents=True)
+        (parent_git / "HEAD").write_text("ref: refs/heads/main\n")
+        (parent_git / "refs" / "heads" / "main").write_text("1" * 40 + "\n")
+        
+        # Submodule layout: the checkout holds a pointer to its own git dir
+        module_git = parent_git / "modules" / "sub"
+        (module_git / "refs" / "heads").mkdir(parents=True)
+        (module_git / "HEAD").write_text("ref: refs/heads/main\n")
+        (module_git / "refs" / "heads" / "main").write_text("3" * 40 + "\n")
+        checkout = tmp_path / "sub"
+        checkout.mkdir()
+        (checkout / ".git").write_text("gitdir: ../.git/modules/sub\n")
+        
+        git_dir = _find_git_dir(checkout / "src")
+        assert git_dir == str(module_git)
+        assert _read_head_sha(git_dir) == "3" * 40
+    
+    def test_git_sha_from_worktree(self, tmp_path):
+        """Test that a worktree resolves its branch through the shared commondir"""
+        main_git = tmp_path / "repo" / ".git"
+        (main_git / "refs" / "heads").mkdir(parents=True)
+        (main_git / "refs" / "heads" / "feature").write_text("4" * 40 + "\n")
+        worktree_git = main_git / "worktrees" / "wt"
+        worktree_git.mkdir(parents=True)
+        (worktree_git / "HEAD").write_text("ref: refs/heads/feature\n")
+        (worktree_git / "commondir").write_text("../..\n")
+        checkout = tmp_path / "wt"
+        checkout.mkdir()
+        (checkout / ".git").write_text(f"gitdir: {worktree_git}\n")
+        
+        git_dir = _find_git_dir(checkout)
+        assert _read_head_sha(git_dir) == "4" * 40
+
+class TestDataCache:
+    """Test the on-disk Cleveland dataset cache"""
+    
+    @pytest.fixture(autouse=True)
+    def isolated_cache(self, tmp_path, monkeypatch):
+        # DATA_CACHE_PATH is relative, so a temporary cwd gives an empty cache
+        monkeypatch.chdir(tmp_path)
+        train._load_cleveland.cache_clear()
+        yield
+        train._load_cleveland.cache_clear()
+    
+    @pytest.fixture
+    def downloads(self, monkeypatch):
+        """Record downloads, serving one small frame per call"""
+        calls = []
+        
+        def fake_read_cleveland_csv(url=train.CLEVELAND_URL):
+            calls.append(url)
+            return pd.DataFrame({'age': [63.0, 67.0], 'target': [float(len(calls)), 0.0]})
+        
+        monkeypatch.setattr(train, "_read_cleveland_csv", fake_read_cleveland_csv)
+        return calls
+    
+    def _expire_cache(self):
+        old = time.time() - (train.DATA_CACHE_MAX_AGE_DAYS + 1) * 86400
+        os.utime(train.DATA_CACHE_PATH, (old, old))
+        train._load_cleveland.cache_clear()
+    
+    def test_fresh_cache_is_reused(self, downloads):
+        """Test a fresh cache is read without downloading again"""
+        first = train.load_data()
+        assert os.path.exists(train.DATA_CACHE_PATH)
+        
+        train._load_cleveland.cache_clear()
+        second = train.load_data()
+        assert len(downloads) == 1
+        pd.testing.assert_frame_equal(first, second)
+        
+    def test_expired_cache_is_refetched(self, downloads):
+        """Test an expired cache is downloaded again and rewritten"""
+        train.load_data()
+        self._expire_cache()
+        
+        df = train.load_data()
+        assert len(downloads) == 2
+        assert df['target'].iloc[0] == 2.0
+        assert train._data_cache_is_fresh()
+        
+    def test_stale_cache_used_when_download_fails(self, downloads, monkeypatch):
+        """Test an expired cache is served with a warning when offline"""
+        train.load_data()
+        self._expire_cache()
+        
+        def offline(url=train.CLEVELAND_URL):
+            raise OSError("network unreachable")
+        
+        monkeypatch.setattr(train, "_read_cleveland_csv", offline)
+        df = train.load_data()
+        assert df['target'].iloc[0] == 1.0
+        
+    def test_download_failure_without_cache_raises(self, monkeypatch):
+        """Test a failed download with no cache at all still raises"""
+        def offline(url=train.CLEVELAND_URL):
+            raise OSError("network unreachable")
+        
+        monkeypatch.setattr(train, "_read_cleveland_csv", offline)
+        with pytest.raises(OSError):
+            train.load_data()
 
 class TestModelValidation:
     """Test model validation and performance"""
@@ -87,18 +253,15 @@ class TestModelValidation:
 class TestDataQuality:
     """Test data quality and validation"""
     
-    def test_data_completeness(self):
+    def test_data_completeness(self, cleveland):
         """Test that data has required completeness"""
-        df = load_data()
-        
         # After preprocessing, should have reasonable amount of data
-        X, y = preprocess(df)
+        _, X, y = cleveland
         assert len(X) >= 200, "Dataset should have at least 200 samples after preprocessing"
         
-    def test_target_distribution(self):
+    def test_target_distribution(self, cleveland):
         """Test target variable distribution"""
-        df = load_data()
-        X, y = preprocess(df)
+        _, X, y = cleveland
         
         # Check that target is binary
         unique_targets = y.unique()
@@ -110,10 +273,9 @@ class TestDataQuality:
         minority_ratio = min(class_counts) / max(class_counts)
         assert minority_ratio >= 0.2, "Classes should not be too imbalanced"
         
-    def test_feature_ranges(self):
+    def test_feature_ranges(self, cleveland):
         """Test that features are within expected ranges"""
-        df = load_data()
-        X, y = preprocess(df)
+        _, X, y = cleveland
         
         # Basic range checks for some features
         if 'age' in X.columns:
@@ -3,14 +3,38 @@ import subprocess
 import sys
 import os
 import time
+import joblib
+import numpy as np
+import pytest
 
-def test_train_creates_model():
-    # Run training
+@pytest.fixture(scope="module")
+def trained_model():
+    # Run training once; every test below inspects the same artifacts
     rc = subprocess.call([sys.executable, "src/train.py"])
     assert rc == 0
     # Wait briefly for file system
     time.sleep(1)
+    return joblib.load("models/model-latest.joblib")["model"]
+
+def test_train_creates_model(trained_model):
     # Expect models/model-latest.joblib to exist
     assert os.path.exists("models/model-latest.joblib")
     # model_version.txt should exist
     assert os.path.exists("model_version.txt")
+
+def test_train_exports_onnx_model(trained_model, cleveland):
+    ort = pytest.importorskip("onnxruntime")
+    pytest.importorskip("skl2onnx")
+    # Expect the compiled export next to the joblib model
+    assert os.path.exists("models/model-latest.onnx")
+    session = ort.InferenceSession("models/model-latest.onnx", providers=["CPUExecutionProvider"])
+    _, X, _ = cleveland
+    rows = X.iloc[:5]
+    labels, proba = session.run(None, {session.get_inputs()[0].name: rows.to_numpy(dtype=np.float32)})
+    # Stamped with the same version as the joblib model from this run
+    with open("model_version.txt") as f:
+        assert session.get_modelmeta().custom_metadata_map["version"] == f.read().strip()
+    assert labels.shape == (5,)
+    assert proba.shape == (5, 2)
+    # The export must score like the joblib model it was converted from
+    assert np.allclose(proba, trained_model.predict_proba(rows), atol=1e-5)
@@ -0,0 +1,43 @@
+"""
+Test suite for utility functions
+"""
+
+import pytest
+import numpy as np
+import os
+import sys
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+
+# Add src to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils import calculate_metrics
+
+def _random_case(seed, n_classes, n=60):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, n_classes, n), rng.integers(0, n_classes, n)
+
+class TestCalculateMetrics:
+    """Test calculate_metrics against sklearn's weighted scores"""
+    
+    @pytest.mark.parametrize("y_true, y_pred", [
+        pytest.param([0, 1, 1, 0, 1, 0], [0, 1, 0, 0, 1, 1], id="binary"),
+        pytest.param([0, 1, 1, 0, 1, 0], [0, 1, 1, 0, 1, 0], id="perfect"),
+        pytest.param([0, 1, 1, 0, 1, 1], [1, 1, 1, 1, 1, 1], id="predicts-only-positive"),
+        pytest.param([0, 1, 1, 0, 1, 1], [0, 0, 0, 0, 0, 0], id="predicts-only-negative"),
+        pytest.param([1, 1, 1, 1], [1, 1, 0, 1], id="single-true-class"),
+        pytest.param([0, 0, 1, 1], [0, 2, 1, 2], id="label-only-in-pred"),
+        pytest.param([0, 1, 2, 2, 1, 0], [0, 2, 1, 2, 0, 0], id="multiclass"),
+        pytest.param(*_random_case(0, 2), id="random-binary"),
+        pytest.param(*_random_case(1, 4), id="random-multiclass"),
+    ])
+    def test_matches_sklearn(self, y_true, y_pred):
+        """Test the fused confusion-matrix metrics equal sklearn's"""
+        y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+        metrics = calculate_metrics(y_true, y_pred)
+        
+        assert metrics['accuracy'] == pytest.approx(accuracy_score(y_true, y_pred))
+        for name, score in (('precision', precision_score), ('recall', recall_score),
+                            ('f1_score', f1_score)):
+            expected = score(y_true, y_pred, average='weighted', zero_division=0)
+            assert metrics[name] == pytest.approx(expected), name